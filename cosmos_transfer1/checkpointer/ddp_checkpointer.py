@@ -13,6 +13,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import gc
 import os
 import threading
 from collections import namedtuple
@@ -129,6 +130,10 @@ class Checkpointer(AbstractCheckpointer):
         state_dict = self.generate_save_state_dict(model, optimizer, scheduler, grad_scaler, iteration)
         state_dict = self._map_state_dict_path_during_save(state_dict, checkpoint_file, model)
         if state_dict:
+            if self.config_checkpoint.gc_before_save:
+                # Release the transient GPU buffers of staging so they do not stay cached for the rest of training.
+                gc.collect()
+                torch.cuda.empty_cache()
             # Wait for previous saver thread to end.
             if self.save_thread:
                 self.save_thread.join()
@@ -19,8 +19,8 @@ Usage:
     - [debug small model, 1 gpu] torchrun --nproc_per_node=8 -m projects.edify_image.v4.train --config=projects/edify_video/v4/config/ctrl/config.py -- experiment=CTRL_tp_121frames_control_input_bbox_image_block3  model.net.num_blocks=1 model.context_parallel_size=1 checkpoint.load_path="" job.group=debug trainer.logging_iter=5
 """
 
-import copy
 import os
+from functools import lru_cache, partial
 
 from hydra.core.config_store import ConfigStore
 from megatron.core import parallel_state
@@ -37,10 +37,7 @@ from cosmos_transfer1.checkpoints import (
 from cosmos_transfer1.diffusion.config.base.data import get_sampler
 from cosmos_transfer1.diffusion.config.transfer.conditioner import CTRL_HINT_KEYS_COMB
 from cosmos_transfer1.diffusion.datasets.example_transfer_dataset import AVTransferDataset
-from cosmos_transfer1.diffusion.training.models.extend_model_multiview_ctrl import (
-    FSDPMultiVideoDiffusionModelWithCtrl,
-    MultiVideoDiffusionModelWithCtrl,
-)
+from cosmos_transfer1.diffusion.training.models.extend_model_multiview_ctrl import MultiVideoDiffusionModelWithCtrl
 from cosmos_transfer1.diffusion.training.networks.general_dit import GeneralDIT
 from cosmos_transfer1.diffusion.training.networks.general_dit_multi_camera import VideoExtendGeneralDIT
 from cosmos_transfer1.utils.lazy_config import LazyCall as L
@@ -53,6 +50,8 @@ num_frames = 57
 num_control_blocks = 3
 ckpt_root = "checkpoints/"
 data_root = "datasets/waymo_transfer/"
+# Split the node's CPUs evenly across the local ranks, capped at 16 dataloader workers per rank.
+num_workers = min(max(1, (os.cpu_count() or 1) // max(1, int(os.environ.get("LOCAL_WORLD_SIZE", "1")))), 16)
 
 t2w_mv_model_names = {
     "hdmap": SV2MV_t2w_HDMAP2WORLD_CONTROLNET_7B_CHECKPOINT_PATH,
@@ -63,46 +62,62 @@ v2w_mv_model_names = {
     "lidar": SV2MV_v2w_LIDAR2WORLD_CONTROLNET_7B_CHECKPOINT_PATH,
 }
 
+# Hydra defaults shared by all the experiments; the hint_key override is appended per experiment.
+_BASE_DEFAULTS = (
+    {"override /net": "faditv2_7b"},
+    {"override /net_ctrl": "faditv2_sv2mv"},
+    {"override /conditioner": "view_cond_ctrlnet_add_fps_image_size_padding_mask"},
+    {"override /tokenizer": "cosmos_diffusion_tokenizer_res720_comp8x8x8_t121_ver092624"},
+    {"override /callbacks": "basic"},
+    {"override /checkpoint": "local"},
+    {"override /ckpt_klass": "fast_tp"},
+)
 
-def make_ctrlnet_config(
+# Checkpoint paths, keyed by t2w (and hint key), computed once for all the registered experiments.
+_BASE_TP_CKPT_PATHS = {
+    True: os.path.join(
+        ckpt_root,
+        os.path.dirname(BASE_t2w_7B_SV2MV_CHECKPOINT_AV_SAMPLE_PATH),
+        "checkpoints_tp",
+        "t2w_base_model_model_mp_*.pt",
+    ),
+    False: os.path.join(
+        ckpt_root,
+        os.path.dirname(BASE_v2w_7B_SV2MV_CHECKPOINT_AV_SAMPLE_PATH),
+        "checkpoints_tp",
+        "v2w_base_model_model_mp_*.pt",
+    ),
+}
+# note: The TP ckpt path are specified as <name>.pt to the script, but actually the <name>_model_mp_*.pt files will be loaded.
+_TP_CKPT_PATHS = {
+    (t2w, f"control_input_{hint_key_short}"): os.path.join(
+        ckpt_root, os.path.dirname(ckpt_path), "checkpoints_tp", os.path.basename(ckpt_path)
+    )
+    for t2w, mv_model_names in [(True, t2w_mv_model_names), (False, v2w_mv_model_names)]
+    for hint_key_short, ckpt_path in mv_model_names.items()
+}
+
+
+@lru_cache(maxsize=None)
+def _layer_mask(num_blocks: int, num_control_blocks: int) -> tuple:
+    # Only the first `num_control_blocks` blocks are kept in the control branch; the rest are masked out.
+    return tuple(i >= num_control_blocks for i in range(num_blocks))
+
+
+@lru_cache(maxsize=None)
+def _build_base(
     hint_key: str = "control_input_hdmap",
     num_control_blocks: int = 3,
-    pretrain_model_path: str = "",
     t2w: bool = True,
     num_frames=121,
-) -> LazyDict:
-    if pretrain_model_path == "":
-        if t2w:
-            job_name = f"CTRL_7Bv1pt3_t2w_sv2mv_{num_frames}frames_{hint_key}_block{num_control_blocks}_pretrain"
-            job_project = "cosmos_transfer1_pretrain"
-        else:
-            job_name = f"CTRL_7Bv1pt3_v2w_sv2mv_{num_frames}frames_{hint_key}_block{num_control_blocks}_pretrain"
-            job_project = "cosmos_transfer1_pretrain"
-    else:
-        if t2w:
-            job_name = f"CTRL_7Bv1pt3_t2w_sv2mv_{num_frames}frames_{hint_key}_block{num_control_blocks}_posttrain"
-            job_project = "cosmos_transfer1_posttrain"
-        else:
-            job_name = f"CTRL_7Bv1pt3_v2w_sv2mv_{num_frames}frames_{hint_key}_block{num_control_blocks}_posttrain"
-            job_project = "cosmos_transfer1_posttrain"
-    if t2w:
-        base_load_path = os.path.join(
-            ckpt_root,
-            os.path.dirname(
-                BASE_t2w_7B_SV2MV_CHECKPOINT_AV_SAMPLE_PATH if t2w else BASE_v2w_7B_SV2MV_CHECKPOINT_AV_SAMPLE_PATH
-            ),
-            "checkpoints_tp",
-            "t2w_base_model_model_mp_*.pt",
-        )
-    else:
-        base_load_path = os.path.join(
-            ckpt_root,
-            os.path.dirname(
-                BASE_t2w_7B_SV2MV_CHECKPOINT_AV_SAMPLE_PATH if t2w else BASE_v2w_7B_SV2MV_CHECKPOINT_AV_SAMPLE_PATH
-            ),
-            "checkpoints_tp",
-            "v2w_base_model_model_mp_*.pt",
-        )
+) -> dict:
+    """
+    Build the config entries shared by the pretrain and post-train variants of an experiment.
+
+    Returns a plain dict rather than a LazyDict; `make_ctrlnet_config` only overrides `job` and `checkpoint` on top of
+    it. The result is cached per set of arguments and shared by the experiments built from them, so it must not be
+    mutated; wrapping into a LazyDict copies the nodes.
+    """
     example_multiview_dataset_waymo = L(AVTransferDataset)(
         dataset_dir=data_root,
         num_frames=num_frames,
@@ -121,190 +136,190 @@ def make_ctrlnet_config(
         is_train=True,
     )
 
-    ctrl_config = LazyDict(
-        dict(
-            defaults=[
-                {"override /net": "faditv2_7b"},
-                {"override /net_ctrl": "faditv2_sv2mv"},
-                {"override /conditioner": "view_cond_ctrlnet_add_fps_image_size_padding_mask"},
-                {"override /tokenizer": "cosmos_diffusion_tokenizer_res720_comp8x8x8_t121_ver092624"},
-                {"override /hint_key": hint_key},
-                {"override /callbacks": "basic"},
-                {"override /checkpoint": "local"},
-                {"override /ckpt_klass": "fast_tp"},
-                "_self_",
-            ],
-            job=dict(group="CTRL_7Bv1_sampleAV", project=job_project, name=job_name),
-            optimizer=dict(
-                lr=2 ** (-14.3),  # ~5e-5
-                weight_decay=0.1,
-                betas=[0.9, 0.99],
-                eps=1e-10,
+    base = dict(
+        defaults=[
+            *_BASE_DEFAULTS,
+            {"override /hint_key": hint_key},
+            "_self_",
+        ],
+        job=dict(group="CTRL_7Bv1_sampleAV"),
+        optimizer=dict(
+            lr=2 ** (-14.3),  # ~5e-5
+            weight_decay=0.1,
+            betas=[0.9, 0.99],
+            eps=1e-10,
+            # bf16 params/grads (model.precision) with fp32 master weights kept by FusedAdam.
+            master_weights=True,
+            capturable=True,
+        ),
+        checkpoint=dict(
+            load_path="",
+            # Modify load_path as needed if you do post-training (fine-tuning). If training from scratch, leave it empty.
+            broadcast_via_filesystem=True,
+            save_iter=1000,
+            gc_before_save=True,
+            load_training_state=False,
+            strict_resume=False,
+            keys_not_to_resume=[],
+        ),
+        trainer=dict(
+            distributed_parallelism="ddp",
+            logging_iter=200,
+            max_iter=999_999_999,
+            callbacks=dict(
+                iter_speed=dict(hit_thres=5),
             ),
-            checkpoint=dict(
-                load_path=pretrain_model_path,
-                # Modify load_path as needed if you do post-training (fine-tuning). If training from scratch, leave it empty.
-                broadcast_via_filesystem=True,
-                save_iter=1000,
-                load_training_state=False,
-                strict_resume=False,
-                keys_not_to_resume=[],
+            timestamp_seed=True,  # important for dataver dataloader!!!
+            ddp=dict(
+                find_unused_parameters=False,
+                static_graph=True,
+                gradient_as_bucket_view=True,
+                bucket_cap_mb=50,
             ),
-            trainer=dict(
-                distributed_parallelism="ddp",
-                logging_iter=200,
-                max_iter=999_999_999,
-                callbacks=dict(
-                    iter_speed=dict(hit_thres=5),
-                ),
-                timestamp_seed=True,  # important for dataver dataloader!!!
+        ),
+        model_parallel=dict(
+            tensor_model_parallel_size=8,
+            sequence_parallel=True,
+        ),
+        model=dict(
+            fsdp_enabled=False,
+            precision="bfloat16",
+            n_views=3,
+            context_parallel_size=1,
+            loss_reduce="mean",
+            latent_shape=[
+                16,
+                (num_frames - 1) // 8 + 1,
+                88,
+                160,
+            ],
+            base_load_from=dict(
+                load_path=_BASE_TP_CKPT_PATHS[t2w],
+                distributed=True,  # read the checkpoint on data parallel rank 0 only and broadcast it
             ),
-            model_parallel=dict(
-                tensor_model_parallel_size=8,
-                sequence_parallel=True,
+            finetune_base_model=False,
+            hint_mask=[True],
+            hint_dropout_rate=0.15,
+            conditioner=dict(
+                video_cond_bool=dict(
+                    condition_location="first_cam" if t2w else "first_cam_and_random_n",
+                    cfg_unconditional_type="zero_condition_region_condition_mask",
+                    apply_corruption_to_condition_region="noise_with_sigma",
+                    condition_on_augment_sigma=False,
+                    dropout_rate=0.0,
+                    first_random_n_num_condition_t_max=0 if t2w else 2,
+                    normalize_condition_latent=False,
+                    augment_sigma_sample_p_mean=-3.0,
+                    augment_sigma_sample_p_std=2.0,
+                    augment_sigma_sample_multiplier=1.0,
+                )
             ),
-            model=dict(
-                fsdp_enabled=False,
+            net=L(VideoExtendGeneralDIT)(
+                in_channels=17,
                 n_views=3,
-                context_parallel_size=1,
-                loss_reduce="mean",
-                latent_shape=[
-                    16,
-                    (num_frames - 1) // 8 + 1,
-                    88,
-                    160,
-                ],
-                base_load_from=dict(load_path=base_load_path),
-                finetune_base_model=False,
-                hint_mask=[True],
-                hint_dropout_rate=0.15,
-                conditioner=dict(
-                    video_cond_bool=dict(
-                        condition_location="first_cam" if t2w else "first_cam_and_random_n",
-                        cfg_unconditional_type="zero_condition_region_condition_mask",
-                        apply_corruption_to_condition_region="noise_with_sigma",
-                        condition_on_augment_sigma=False,
-                        dropout_rate=0.0,
-                        first_random_n_num_condition_t_max=0 if t2w else 2,
-                        normalize_condition_latent=False,
-                        augment_sigma_sample_p_mean=-3.0,
-                        augment_sigma_sample_p_std=2.0,
-                        augment_sigma_sample_multiplier=1.0,
-                    )
-                ),
-                net=L(VideoExtendGeneralDIT)(
-                    in_channels=17,
-                    n_views=3,
-                    n_views_emb=7,
-                    view_condition_dim=6,
-                    add_repeat_frame_embedding=True,
-                    extra_per_block_abs_pos_emb=True,
-                    pos_emb_learnable=True,
-                    extra_per_block_abs_pos_emb_type="learnable",
-                    num_blocks=num_blocks,
-                ),
-                adjust_video_noise=True,
-                net_ctrl=dict(
-                    in_channels=16,  # + 1 for cond_mask, +1 for padding mask, +6 for cam
-                    hint_channels=16,
-                    num_blocks=num_blocks,
-                    n_views=3,
-                    n_views_emb=7,
-                    view_condition_dim=6,
-                    add_repeat_frame_embedding=True,
-                    is_extend_model=True,
-                    layer_mask=[True if (i >= num_control_blocks) else False for i in range(num_blocks)],
-                    extra_per_block_abs_pos_emb=True,
-                    pos_emb_learnable=True,
-                    extra_per_block_abs_pos_emb_type="learnable",
-                ),
-                tokenizer=dict(
-                    pixel_chunk_duration=num_frames,
-                ),
+                n_views_emb=7,
+                view_condition_dim=6,
+                add_repeat_frame_embedding=True,
+                extra_per_block_abs_pos_emb=True,
+                pos_emb_learnable=True,
+                extra_per_block_abs_pos_emb_type="learnable",
+                num_blocks=num_blocks,
+                # Activation checkpointing (non-reentrant) per transformer block; longer clips need every block.
+                use_checkpoint=True,
+                checkpoint_every_n=1 if num_frames > 57 else 2,
             ),
-            model_obj=L(MultiVideoDiffusionModelWithCtrl)(),
-            dataloader_train=L(DataLoader)(
-                dataset=example_multiview_dataset_waymo,
-                sampler=L(get_sampler)(dataset=example_multiview_dataset_waymo),
-                batch_size=1,
-                drop_last=True,
-                pin_memory=True,
-                num_workers=8,
+            adjust_video_noise=True,
+            net_ctrl=dict(
+                in_channels=16,  # + 1 for cond_mask, +1 for padding mask, +6 for cam
+                hint_channels=16,
+                num_blocks=num_blocks,
+                n_views=3,
+                n_views_emb=7,
+                view_condition_dim=6,
+                add_repeat_frame_embedding=True,
+                is_extend_model=True,
+                layer_mask=list(_layer_mask(num_blocks, num_control_blocks)),
+                use_checkpoint=True,
+                checkpoint_every_n=1 if num_frames > 57 else 2,
+                extra_per_block_abs_pos_emb=True,
+                pos_emb_learnable=True,
+                extra_per_block_abs_pos_emb_type="learnable",
             ),
-            dataloader_val=L(DataLoader)(
-                dataset=example_multiview_dataset_waymo,
-                sampler=L(get_sampler)(dataset=example_multiview_dataset_waymo),
-                batch_size=1,
-                drop_last=True,
-                pin_memory=True,
-                num_workers=8,
+            tokenizer=dict(
+                pixel_chunk_duration=num_frames,
             ),
+        ),
+        model_obj=L(MultiVideoDiffusionModelWithCtrl)(),
+        dataloader_train=L(DataLoader)(
+            dataset=example_multiview_dataset_waymo,
+            sampler=L(get_sampler)(dataset=example_multiview_dataset_waymo),
+            batch_size=1,
+            drop_last=True,
+            pin_memory=True,
+            num_workers=num_workers,
+            persistent_workers=True,  # keep workers (and their dataset state) alive across epochs
+            prefetch_factor=4,
+        ),
+        dataloader_val=L(DataLoader)(
+            dataset=example_multiview_dataset_waymo,
+            sampler=L(get_sampler)(dataset=example_multiview_dataset_waymo),
+            batch_size=1,
+            drop_last=True,
+            pin_memory=True,
+            num_workers=num_workers,
+            persistent_workers=True,  # keep workers (and their dataset state) alive across epochs
+            prefetch_factor=4,
+        ),
+    )
+    return base
+
+
+def make_ctrlnet_config(
+    hint_key: str = "control_input_hdmap",
+    num_control_blocks: int = 3,
+    pretrain_model_path: str = "",
+    t2w: bool = True,
+    num_frames=121,
+) -> LazyDict:
+    base = _build_base(hint_key, num_control_blocks, t2w, num_frames)
+    stage = "pretrain" if pretrain_model_path == "" else "posttrain"
+    model_type = "t2w" if t2w else "v2w"
+    job_name = f"CTRL_7Bv1pt3_{model_type}_sv2mv_{num_frames}frames_{hint_key}_block{num_control_blocks}_{stage}"
+    job_project = f"cosmos_transfer1_{stage}"
+    return LazyDict(
+        dict(
+            base,
+            job=dict(base["job"], project=job_project, name=job_name),
+            checkpoint=dict(base["checkpoint"], load_path=pretrain_model_path),
         )
     )
-    return ctrl_config
 
 
+store_experiment = partial(cs.store, group="experiment", package="_global_")
+
 all_hint_key = [
     "control_input_hdmap",
     "control_input_lidar",
 ]
 
 for key in all_hint_key:
-    # Register experiments for pretraining from scratch
-    t2w_config = make_ctrlnet_config(
-        hint_key=key, num_control_blocks=num_control_blocks, pretrain_model_path="", t2w=True, num_frames=num_frames
-    )
-    v2w_config = make_ctrlnet_config(
-        hint_key=key, num_control_blocks=num_control_blocks, pretrain_model_path="", t2w=False, num_frames=num_frames
-    )
+    for t2w in [True, False]:
+        # Register experiments for pretraining from scratch
+        config = make_ctrlnet_config(
+            hint_key=key,
+            num_control_blocks=num_control_blocks,
+            pretrain_model_path="",
+            t2w=t2w,
+            num_frames=num_frames,
+        )
+        store_experiment(name=config["job"]["name"], node=config)
 
-    cs.store(
-        group="experiment",
-        package="_global_",
-        name=t2w_config["job"]["name"],
-        node=t2w_config,
-    )
-    cs.store(
-        group="experiment",
-        package="_global_",
-        name=v2w_config["job"]["name"],
-        node=v2w_config,
-    )
-    # Register experiments for post-training from TP checkpoints.
-    hint_key_short = key.replace("control_input_", "")  # "control_input_vis" -> "vis"
-    t2w_pretrain_ckpt_path = t2w_mv_model_names[hint_key_short]
-    v2w_pretrain_ckpt_path = v2w_mv_model_names[hint_key_short]
-    # note: The TP ckpt path are specified as <name>.pt to the script, but actually the <name>_model_mp_*.pt files will be loaded.
-    t2w_tp_ckpt_path = os.path.join(
-        ckpt_root, os.path.dirname(t2w_pretrain_ckpt_path), "checkpoints_tp", os.path.basename(t2w_pretrain_ckpt_path)
-    )
-    v2w_tp_ckpt_path = os.path.join(
-        ckpt_root, os.path.dirname(v2w_pretrain_ckpt_path), "checkpoints_tp", os.path.basename(v2w_pretrain_ckpt_path)
-    )
-    # tp_ckpt_path = os.path.join(ckpt_root, SV2MV_t2w_HDMAP2WORLD_CONTROLNET_7B_CHECKPOINT_PATH_dbg)
-    t2w_posttrain_config = make_ctrlnet_config(
-        hint_key=key,
-        num_control_blocks=num_control_blocks,
-        pretrain_model_path=t2w_tp_ckpt_path,
-        t2w=True,
-        num_frames=num_frames,
-    )
-    v2w_posttrain_config = make_ctrlnet_config(
-        hint_key=key,
-        num_control_blocks=num_control_blocks,
-        pretrain_model_path=v2w_tp_ckpt_path,
-        t2w=False,
-        num_frames=num_frames,
-    )
-    cs.store(
-        group="experiment",
-        package="_global_",
-        name=t2w_posttrain_config["job"]["name"],
-        node=t2w_posttrain_config,
-    )
-    cs.store(
-        group="experiment",
-        package="_global_",
-        name=v2w_posttrain_config["job"]["name"],
-        node=v2w_posttrain_config,
-    )
+        # Register experiments for post-training from TP checkpoints; they reuse the cached base of the pretrain ones.
+        config = make_ctrlnet_config(
+            hint_key=key,
+            num_control_blocks=num_control_blocks,
+            pretrain_model_path=_TP_CKPT_PATHS[(t2w, key)],
+            t2w=t2w,
+            num_frames=num_frames,
+        )
+        store_experiment(name=config["job"]["name"], node=config)
@@ -31,3 +31,12 @@ class CtrlModelConfig(DefaultModelConfig):
     random_drop_control_blocks: bool = False
     pixel_corruptor: LazyDict = None
     n_views: int = 1
+    # torch.compile each transformer block in place (state_dict keys are unchanged). Multiview ctrl models only.
+    compile: LazyDict = LazyDict(
+        dict(
+            enabled=False,
+            mode="reduce-overhead",
+            dynamic=False,
+            fullgraph=False,
+        )
+    )
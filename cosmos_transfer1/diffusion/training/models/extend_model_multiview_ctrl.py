@@ -32,7 +32,7 @@ from cosmos_transfer1.diffusion.training.models.extend_model_multiview import Mu
 from cosmos_transfer1.diffusion.training.models.model import DiffusionModel as VideoDiffusionModel
 from cosmos_transfer1.diffusion.training.models.model import _broadcast, broadcast_condition
 from cosmos_transfer1.diffusion.training.models.model_image import diffusion_fsdp_class_decorator
-from cosmos_transfer1.utils import log, misc
+from cosmos_transfer1.utils import distributed, log, misc
 from cosmos_transfer1.utils.lazy_config import instantiate as lazy_instantiate
 
 IS_PREPROCESSED_KEY = "is_preprocessed"
@@ -85,6 +85,18 @@ class MultiVideoDiffusionModelWithCtrl(MultiviewExtendDiffusionModel):
         if parallel_state.is_initialized() and parallel_state.get_tensor_model_parallel_world_size() > 1:
             if parallel_state.sequence_parallel:
                 self.base_net.enable_sequence_parallel()
+        compile_config = getattr(self.config, "compile", None)
+        if compile_config is not None and compile_config["enabled"]:
+            if not hasattr(torch.nn.Module, "compile"):
+                log.warning("Per-block torch.compile requires Pytorch >= 2.2. Skipping compilation.")
+            else:
+                log.critical(f"Compiling transformer blocks of base and ctrlnet models: {compile_config}")
+                for net in (self.base_net, self.model.net):
+                    net.compile_blocks(
+                        mode=compile_config["mode"],
+                        dynamic=compile_config["dynamic"],
+                        fullgraph=compile_config["fullgraph"],
+                    )
         if hasattr(self.config, "use_torch_compile") and self.config.use_torch_compile:  # compatible with old config
             # not tested yet
             if torch.__version__ < "2.3":
@@ -107,7 +119,17 @@ class MultiVideoDiffusionModelWithCtrl(MultiviewExtendDiffusionModel):
             mp_rank = parallel_state.get_model_parallel_group().rank()
             checkpoint_path = checkpoint_path.replace("*", f"{mp_rank}")
 
-        if checkpoint_path:
+        # With `distributed=True`, only data parallel rank 0 reads its TP shard from disk and broadcasts it to the
+        # other data parallel ranks holding the same shard, instead of every rank reading the same file.
+        broadcast = (
+            bool(checkpoint_path)
+            and config.base_load_from.get("distributed", False)
+            and parallel_state.is_initialized()
+            and parallel_state.get_data_parallel_world_size(with_context_parallel=True) > 1
+        )
+        if checkpoint_path and (
+            not broadcast or parallel_state.get_data_parallel_rank(with_context_parallel=True) == 0
+        ):
             log.info(f"Loading base model checkpoint (local): {checkpoint_path}", False)
             state_dict = torch.load(checkpoint_path, map_location=lambda storage, loc: storage)
             log.success(f"Complete loading base model checkpoint (local): {checkpoint_path}", False)
@@ -128,6 +150,12 @@ class MultiVideoDiffusionModelWithCtrl(MultiviewExtendDiffusionModel):
             except Exception:
                 log.critical("load model in non-strict mode", False)
                 log.critical(non_strict_load_model(base_model, base_state_dict), rank0_only=False)
+        if broadcast:
+            with misc.timer("Broadcast base model states across data parallel ranks"):
+                base_model.cuda()
+                distributed.sync_model_states(
+                    base_model, parallel_state.get_data_parallel_group(with_context_parallel=True)
+                )
         log.info("Done loading the base model checkpoint.", False)
 
     def get_data_and_condition(
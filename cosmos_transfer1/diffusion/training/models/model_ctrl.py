@@ -85,6 +85,9 @@ def ctrlnet_decorator(base_class: Type[T]) -> Type[T]:
             if parallel_state.is_initialized() and parallel_state.get_tensor_model_parallel_world_size() > 1:
                 if parallel_state.sequence_parallel:
                     self.base_net.enable_sequence_parallel()
+            compile_config = getattr(self.config, "compile", None)
+            if compile_config is not None and compile_config["enabled"]:
+                log.warning("Per-block torch.compile (model.compile) is only supported by multiview ctrl models.")
             if (
                 hasattr(self.config, "use_torch_compile") and self.config.use_torch_compile
             ):  # compatible with old config
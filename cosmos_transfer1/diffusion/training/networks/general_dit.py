@@ -964,6 +964,15 @@ class GeneralDIT(nn.Module):
     def fsdp_wrap_block_cls(self):
         return DITBuildingBlock
 
+    def compile_blocks(self, mode: str = "default", dynamic: bool = False, fullgraph: bool = False) -> None:
+        """Compile every transformer block in place with torch.compile.
+
+        nn.Module.compile() keeps the module hierarchy, so state_dict keys (and thus checkpoints) are unchanged.
+        The repeated blocks share the same code, so they mostly hit the same compiled graph.
+        """
+        for block in self.blocks.values():
+            block.compile(mode=mode, dynamic=dynamic, fullgraph=fullgraph)
+
     def enable_context_parallel(self, cp_group: ProcessGroup):
         cp_ranks = get_process_group_ranks(cp_group)
         cp_size = len(cp_ranks)
@@ -57,6 +57,7 @@ class MultiCameraGeneralDIT(GeneralDIT):
         concat_view_embedding: bool = True,
         concat_traj_embedding: bool = False,
         add_repeat_frame_embedding: bool = False,
+        checkpoint_every_n: int = 1,
         **kwargs,
     ):
         if kwargs.get("add_augment_sigma_embedding", None) is not None:
@@ -71,6 +72,8 @@ class MultiCameraGeneralDIT(GeneralDIT):
         self.traj_condition_dim = traj_condition_dim
         self.concat_traj_embedding = concat_traj_embedding
         self.add_repeat_frame_embedding = add_repeat_frame_embedding
+        # With use_checkpoint, only every `checkpoint_every_n`-th block recomputes its activations in backward.
+        self.checkpoint_every_n = checkpoint_every_n
 
         super().__init__(*args, **kwargs)
         # reinit self.blocks
@@ -99,6 +102,7 @@ class MultiCameraGeneralDIT(GeneralDIT):
                 use_adaln_lora=self.use_adaln_lora,
                 adaln_lora_dim=self.adaln_lora_dim,
                 n_views=self.n_views,
+                use_checkpoint=self.use_checkpoint and idx % self.checkpoint_every_n == 0,
             )
         self.view_embeddings = nn.Embedding(self.n_views_emb, view_condition_dim)  # Learnable embedding layer
 
@@ -102,6 +102,13 @@ class CuDNNConfig:
     benchmark: bool = True
 
 
+@make_freezable
+@attrs.define(slots=False)
+class BackendTuningConfig:
+    # Allow TF32 for cuDNN convolutions and CUDA matmuls.
+    allow_tf32: bool = True
+
+
 @make_freezable
 @attrs.define(slots=False)
 class JITConfig:
@@ -124,6 +131,8 @@ class CheckpointConfig:
     type: Optional[Dict] = None
     # for dcp, whether to use async mode
     dcp_async_mode_enabled: bool = False
+    # Run gc.collect() and torch.cuda.empty_cache() once the state dict is staged to CPU, before the saver thread starts.
+    gc_before_save: bool = False
     # Save the checkpoint every N iterations.
     save_iter: int = 999999999
     # Path of model weights to resume the checkpoint from.
@@ -165,6 +174,8 @@ class TrainerConfig:
     ddp: DDPConfig = attrs.field(factory=DDPConfig)
     # cuDNN configs.
     cudnn: CuDNNConfig = attrs.field(factory=CuDNNConfig)
+    # torch.backends settings (TF32).
+    backend_tuning: BackendTuningConfig = attrs.field(factory=BackendTuningConfig)
     # Set the random seed.
     seed: int = 0
     # Gradient scaler arguments (for torch.amp.GradScaler).
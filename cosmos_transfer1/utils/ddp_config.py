@@ -15,7 +15,7 @@
 
 from __future__ import annotations
 
-from typing import TypeVar
+from typing import Optional, TypeVar
 
 import attrs
 
@@ -106,3 +106,9 @@ class DDPConfig:
     static_graph: bool = True
     # Set to True if we want to synchronize buffers. Set to False if the sync is going to be handled elsewhere.
     broadcast_buffers: bool = True
+    # Let gradients be views into the allreduce buckets (saves a copy and the memory of one gradient set).
+    gradient_as_bucket_view: bool = False
+    # Size of the gradient allreduce buckets in MB.
+    bucket_cap_mb: int = 25
+    # Optional gradient communication hook, choices: [None, "fp16_compress", "bf16_compress"].
+    comm_hook: Optional[str] = None
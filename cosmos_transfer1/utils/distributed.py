@@ -27,6 +27,7 @@ from typing import Any, Callable, Optional, TypeVar
 import pynvml
 import torch
 import torch.distributed as dist
+from torch.distributed.algorithms.ddp_comm_hooks import default_hooks
 from torch.nn.parallel import DistributedDataParallel as DDP
 
 from cosmos_transfer1.utils import log
@@ -209,7 +210,17 @@ def parallel_model_wrapper(config_ddp: DDPConfig, model: torch.nn.Module) -> tor
             static_graph=config_ddp.static_graph,
             broadcast_buffers=config_ddp.broadcast_buffers,
             process_group=ddp_group,
+            gradient_as_bucket_view=config_ddp.gradient_as_bucket_view,
+            bucket_cap_mb=config_ddp.bucket_cap_mb,
         )
+        if config_ddp.comm_hook is not None:
+            # Compress gradients before the allreduce and decompress them afterwards.
+            hook = {
+                "fp16_compress": default_hooks.fp16_compress_hook,
+                "bf16_compress": default_hooks.bf16_compress_hook,
+            }[config_ddp.comm_hook]
+            log.info(f"Registering DDP comm hook: {config_ddp.comm_hook}")
+            model.register_comm_hook(state=ddp_group, hook=hook)
     return model
 
 
@@ -310,3 +321,33 @@ def broadcast(tensor, src, group=None, async_op=False):
     if world_size < 2:
         return tensor
     dist.broadcast(tensor, src=src, group=group, async_op=async_op)
+
+
+@torch.no_grad()
+def sync_model_states(
+    model: torch.nn.Module,
+    process_group: Optional[dist.ProcessGroup] = None,
+    src: int = 0,
+    broadcast_buffers: bool = True,
+    bucket_size: int = 250 * 1024 * 1024,
+) -> None:
+    """Broadcast the parameters (and buffers) of a model from one rank to all the other ranks of a process group.
+
+    This is what DDP / FSDP do with sync_module_states, so only one rank of the group has to load weights from disk.
+
+    Args:
+        model (torch.nn.Module): The model to synchronize. Its tensors must be on the device of the backend (CUDA for NCCL).
+        process_group (dist.ProcessGroup | None): The process group to synchronize in (default: the global group).
+        src (int): The source rank within the process group.
+        broadcast_buffers (bool): Also synchronize the buffers of the model.
+        bucket_size (int): The size in bytes of the coalesced broadcast buckets.
+    """
+    if get_world_size(process_group) < 2:
+        return
+    module_states = [param.detach() for param in model.parameters()]
+    if broadcast_buffers:
+        module_states.extend(buffer.detach() for buffer in model.buffers())
+    if module_states:
+        dist._broadcast_coalesced(
+            process_group if process_group is not None else dist.group.WORLD, module_states, bucket_size, src
+        )
@@ -93,7 +93,8 @@ class Trainer:
         torch.backends.cudnn.deterministic = config.trainer.cudnn.deterministic
         torch.backends.cudnn.benchmark = config.trainer.cudnn.benchmark
         # Floating-point precision settings.
-        torch.backends.cudnn.allow_tf32 = torch.backends.cuda.matmul.allow_tf32 = True
+        allow_tf32 = config.trainer.backend_tuning.allow_tf32
+        torch.backends.cudnn.allow_tf32 = torch.backends.cuda.matmul.allow_tf32 = allow_tf32
         # Initialize the callback functions.
         self.callbacks = callback.CallBackGroup(config=config, trainer=self)
         # Initialize the model checkpointer.